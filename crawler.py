@@ -4,6 +4,14 @@ from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
 from crawl4ai.content_filter_strategy import PruningContentFilter
 from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
 
+# Patterns are compiled once at import; the helpers below run them on every line of every page
+TICKER_RUN_RE = re.compile(r'([A-Z] \| ){5,}')
+BOILERPLATE_RE = re.compile(r"(Table of Contents|Read more|Partner Links|More Videos).*?\n", flags=re.DOTALL)
+URL_RE = re.compile(r'https?://\S+')
+CLICKBAIT_PHRASES = tuple(p.lower() for p in (
+    "Sponsored", "Advisors:", "click here", "Partner Links", "Advertisement"
+))
+
 async def crawl_and_chunk(urls, output_path):
     os.makedirs(output_path, exist_ok=True)
 
@@ -43,8 +51,8 @@ async def crawl_and_chunk(urls, output_path):
                 clean_content = getattr(result, 'fit_markdown', result.markdown)
                
                 # Remove dictionary junk and common boilerplate
-                clean_content = re.sub(r'([A-Z] \| ){5,}', '', clean_content)
-                clean_content = re.sub(r"(Table of Contents|Read more|Partner Links|More Videos).*?\n", "", clean_content, flags=re.DOTALL)
+                clean_content = TICKER_RUN_RE.sub('', clean_content)
+                clean_content = BOILERPLATE_RE.sub("", clean_content)
 
                 # Remove lines with too many URLs
                 clean_content = remove_lines_with_too_many_urls(clean_content, max_urls=1)
@@ -79,17 +87,15 @@ async def crawl_and_chunk(urls, output_path):
 def remove_lines_with_too_many_urls(text, max_urls=1):
     clean_lines = []
     for line in text.splitlines():
-        url_count = len(re.findall(r'https?://\S+', line))
-        if url_count <= max_urls:
+        # most lines hold no link at all, so skip the regex for them
+        if "http" not in line or len(URL_RE.findall(line)) <= max_urls:
             clean_lines.append(line)
     return "\n".join(clean_lines)
 
 def remove_clickbait_lines(text):
-    blacklist_phrases = [
-        "Sponsored", "Advisors:", "click here", "Partner Links", "Advertisement"
-    ]
-    clean_lines = [
-        line for line in text.splitlines()
-        if not any(phrase.lower() in line.lower() for phrase in blacklist_phrases)
-    ]
+    clean_lines = []
+    for line in text.splitlines():
+        lower_line = line.lower()
+        if not any(phrase in lower_line for phrase in CLICKBAIT_PHRASES):
+            clean_lines.append(line)
     return "\n".join(clean_lines)
\ No newline at end of file
@@ -6,11 +6,12 @@ from config import MAX_URLS_PER_SUBSUBTOPIC
 
 async def main():
     for topic, subs in TOPICS.items():
-        for sub, queries in subs.items():
-            for query in queries:
-                urls = google_search(query, MAX_URLS_PER_SUBSUBTOPIC)
+        for sub, levels in subs.items():
+            for queries in levels.values():
+                for query in queries:
+                    urls = google_search(query, MAX_URLS_PER_SUBSUBTOPIC)
 
-                output_path = f"data/raw/{topic}/{query.replace(' ', '_')}"
-                await crawl_and_chunk(urls, output_path)
+                    output_path = f"data/raw/{topic}/{query.replace(' ', '_')}"
+                    await crawl_and_chunk(urls, output_path)
 
 asyncio.run(main())
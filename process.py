@@ -1,36 +1,97 @@
 import os
-from llama_cpp import Llama
+import glob
+import math
+import ctypes
+import hashlib
+import requests
+import llama_cpp
+from llama_cpp import Llama, LlamaGrammar, GGML_TYPE_Q8_0
+from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
 from dotenv import load_dotenv
 
 load_dotenv()
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 RAW_DIR = os.getenv("RAW_DIR")
 PROCESSED_DIR = os.getenv("PROCESSED_DIR")
 MODEL_PATH = os.getenv("MODEL_PATH")
+CACHE_DIR = os.getenv("CACHE_DIR", "data/cache")
+# When set (e.g. http://localhost:8000), generation goes to a running
+# llama_cpp.server instead of loading the model in this process
+LLM_SERVER_URL = os.getenv("LLM_SERVER_URL")
 
 # ===============================
 # CONFIG
 # ===============================
 
-CTX_SIZE = 2048
 MAX_FINAL_TOKENS = 1500
 MAX_CHUNK_CHARS = 3000  # can increase depending on model RAM
+PROMPT_OVERHEAD_TOKENS = 256  # instructions + topic/subtopic/source lines
+CHARS_PER_TOKEN = 3  # conservative for English web text
+
+# KV cache memory grows with n_ctx, so size it to the largest prompt plus output
+# (rounded up to 512) instead of a fixed guess; CTX_SIZE in .env overrides it
+CTX_SIZE = int(os.getenv("CTX_SIZE", "0")) or math.ceil(
+    (MAX_CHUNK_CHARS / CHARS_PER_TOKEN + PROMPT_OVERHEAD_TOKENS + MAX_FINAL_TOKENS) / 512
+) * 512
+GRAMMAR_PATH = os.path.join(BASE_DIR, "lesson.gbnf")
+
+# Defaults suit a GPU build; override from .env with the best row of a
+# llama-bench sweep on the target host (see README)
+N_GPU_LAYERS = int(os.getenv("N_GPU_LAYERS", "-1"))  # -1 offloads every layer
+N_THREADS = int(os.getenv("N_THREADS", max(1, (os.cpu_count() or 2) // 2)))  # roughly one per physical core
+N_BATCH = int(os.getenv("N_BATCH", "512"))  # prompt tokens per prefill batch
+FLASH_ATTN = os.getenv("FLASH_ATTN", "1") == "1"
+# 8-bit K/V halves cache bandwidth during decode; llama.cpp needs flash attention for it
+KV_CACHE_TYPE = GGML_TYPE_Q8_0 if FLASH_ATTN else None
+# Prompt-lookup speculative decoding drafts tokens by matching n-grams already in
+# the prompt (~10 suits GPU builds, ~2 CPU-only). Off by default: it needs
+# logits_all, which allocates n_ctx x n_vocab float32 scores (~1.5 GB for
+# Llama-3 at n_ctx 3072) and copies every prompt logit
+DRAFT_TOKENS = int(os.getenv("DRAFT_TOKENS", "0"))
 
 # ===============================
 # INITIALIZE MODEL
 # ===============================
-llm = Llama(
-    model_path=MODEL_PATH,
-    n_ctx=CTX_SIZE,
-    n_threads=8,
-    verbose=False
-)
+llm = None
+if not LLM_SERVER_URL:
+    llm = Llama(
+        model_path=MODEL_PATH,
+        n_ctx=CTX_SIZE,
+        n_threads=N_THREADS,
+        n_gpu_layers=N_GPU_LAYERS,
+        n_batch=N_BATCH,
+        n_ubatch=N_BATCH,
+        flash_attn=FLASH_ATTN,
+        offload_kqv=True,
+        type_k=KV_CACHE_TYPE,
+        type_v=KV_CACHE_TYPE,
+        draft_model=LlamaPromptLookupDecoding(num_pred_tokens=DRAFT_TOKENS) if DRAFT_TOKENS else None,
+        logits_all=DRAFT_TOKENS > 0,  # draft verification reads a row per prompt token
+        verbose=False
+    )
+
+# Cache keys use the model that actually generates: the local GGUF path, or
+# the id reported by the server (which may load a different file than MODEL_PATH)
+def served_model_id():
+    resp = requests.get(f"{LLM_SERVER_URL.rstrip('/')}/v1/models", timeout=10)
+    resp.raise_for_status()
+    return f"{LLM_SERVER_URL}\0{resp.json()['data'][0]['id']}"
+
+MODEL_ID = served_model_id() if LLM_SERVER_URL else MODEL_PATH
+
+# Output is constrained to the lesson schema at decode time, so no tokens go to
+# fences or trailing chatter; a summary only fails to parse if generation is
+# cut off by MAX_FINAL_TOKENS
+with open(GRAMMAR_PATH, "r", encoding="utf-8") as f:
+    LESSON_GRAMMAR = f.read()
+grammar = LlamaGrammar.from_string(LESSON_GRAMMAR, verbose=False) if llm is not None else None
 
 # ===============================
 # PROMPT
 # ===============================
-def final_summary_prompt(raw_text, topic, subtopic, source):
-    return f"""
+LESSON_INSTRUCTIONS = """
 You are an expert trading educator.
 
 Using the text below, create a FINAL structured lesson
@@ -41,18 +102,42 @@ Requirements:
 2. summary: concise explanation (7-10 sentences)
 3. key_points (3–7 bullets)
 4. examples (1–3)
-5. definitions (simple explanations, can include analogies)
+5. definitions (1–5 terms, simple explanations, can include analogies)
 6. common_mistakes (1–2)
 7. questions_to_think (1–2)
-8. source: cite the original source of the content.
+8. source: cite the original source of the content in one line.
 
-Text:
-{raw_text}
+Use exactly this layout. Every value is a double-quoted string on a single
+line with no double quotes or backslashes inside it:
+title: "..."
+summary: "..."
+key_points:
+  - "..."
+examples:
+  - "..."
+definitions:
+  - term: "..."
+    definition: "..."
+common_mistakes:
+  - "..."
+questions_to_think:
+  - "..."
+source: "..."
+""".strip()
+
+# Fields that stay the same across files go first so consecutive calls share
+# the longest possible token prefix (llama.cpp reuses the matching KV cache).
+def final_summary_prompt(raw_text, topic, subtopic, source):
+    return f"""
+{LESSON_INSTRUCTIONS}
 
 Topic: {topic}
 Subtopic: {subtopic}
 Source: {source}
 
+Text:
+{raw_text}
+
 Output YAML ONLY.
 """.strip()
 
@@ -64,40 +149,112 @@ def read_file(path):
         return f.read().strip()
 
 def save_yaml(text, path):
+    # Write to a temp file and rename so an interrupted run never leaves a
+    # partial summary or cache entry that later looks complete
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
         f.write(text.strip())
+    os.replace(tmp_path, path)
 
 def safe_truncate(text, max_chars):
     return text[:max_chars]
 
+def load_prefix_state(prefix):
+    # Only the llama.cpp session (KV cache + prefix tokens) is saved to disk, so
+    # later runs skip the instructions' prefill; llama.cpp then reuses it as the
+    # first prompt's matching prefix. The key covers everything the KV depends on.
+    key = hashlib.sha256(f"{MODEL_PATH}\0{CTX_SIZE}\0{KV_CACHE_TYPE}\0{prefix}".encode("utf-8")).hexdigest()[:16]
+    state_path = os.path.join(BASE_DIR, f".llama_prefix_state-{key}.bin")
+    tokens = llm.tokenize(prefix.encode("utf-8"))
+    token_array = (llama_cpp.llama_token * len(tokens))(*tokens)
+
+    if os.path.exists(state_path):
+        n_loaded = ctypes.c_size_t(0)
+        loaded = llama_cpp.llama_state_load_file(
+            llm._ctx.ctx, state_path.encode("utf-8"), token_array, len(tokens), ctypes.byref(n_loaded)
+        )
+        if loaded and list(token_array[:n_loaded.value]) == tokens:
+            llm.input_ids[:len(tokens)] = tokens
+            llm.n_tokens = len(tokens)
+            return
+        # unreadable or stale file: treat as a miss and prefill again
+        print(f"Warning: ignoring unusable prefix state {state_path}")
+        llm.reset()
+        token_array = (llama_cpp.llama_token * len(tokens))(*tokens)
+
+    llm.eval(tokens)
+    tmp_path = f"{state_path}.tmp"
+    if llama_cpp.llama_state_save_file(llm._ctx.ctx, tmp_path.encode("utf-8"), token_array, len(tokens)):
+        os.replace(tmp_path, state_path)
+        for old_path in glob.glob(os.path.join(BASE_DIR, ".llama_prefix_state-*.bin")):
+            if old_path != state_path:
+                os.remove(old_path)
+
 def generate(prompt, max_tokens):
-    response = llm(prompt, max_tokens=max_tokens)
+    if LLM_SERVER_URL:
+        resp = requests.post(
+            f"{LLM_SERVER_URL.rstrip('/')}/v1/completions",
+            json={"prompt": prompt, "max_tokens": max_tokens, "grammar": LESSON_GRAMMAR},
+            timeout=600
+        )
+        resp.raise_for_status()
+        response = resp.json()
+    else:
+        response = llm(prompt, max_tokens=max_tokens, grammar=grammar)
     text = response["choices"][0]["text"].strip()
     if not text:
         print("Warning: LLM returned empty output!")
     return text
 
+def cached_generate(prompt, max_tokens):
+    # Outputs are keyed by everything that determines them, so an unchanged
+    # prompt is served from CACHE_DIR instead of re-running the model.
+    key = hashlib.sha256(f"{MODEL_ID}\0{max_tokens}\0{LESSON_GRAMMAR}\0{prompt}".encode("utf-8")).hexdigest()
+    cache_path = os.path.join(CACHE_DIR, f"{key}.yaml")
+    if os.path.exists(cache_path):
+        print(f" Cache hit: {cache_path}")
+        return read_file(cache_path)
+
+    text = generate(prompt, max_tokens)
+    if text:
+        save_yaml(text, cache_path)
+    return text
+
 # ===============================
 # PIPELINE: ONE-TO-ONE CHUNKS
 # ===============================
-for main_topic in os.listdir(RAW_DIR):
-    main_path = os.path.join(RAW_DIR, main_topic)
-    if not os.path.isdir(main_path):
-        continue
+if llm is not None:
+    load_prefix_state(LESSON_INSTRUCTIONS)
 
-    for subtopic in os.listdir(main_path):
-        sub_path = os.path.join(main_path, subtopic)
-        if not os.path.isdir(sub_path):
-            continue
+# scandir entries carry their file type from the directory read,
+# so filtering directories and .txt files needs no extra stat() calls
+with os.scandir(RAW_DIR) as main_entries:
+    main_dirs = [e for e in main_entries if e.is_dir()]
 
+for main_entry in main_dirs:
+    main_topic = main_entry.name
+    with os.scandir(main_entry.path) as sub_entries:
+        sub_dirs = [e for e in sub_entries if e.is_dir()]
+
+    for sub_entry in sub_dirs:
+        subtopic = sub_entry.name
         print(f"\nProcessing: {main_topic} → {subtopic}")
 
-        for file in sorted(os.listdir(sub_path)):
-            if not file.endswith(".txt"):
+        with os.scandir(sub_entry.path) as file_entries:
+            txt_files = sorted(
+                (e for e in file_entries if e.is_file() and e.name.endswith(".txt")),
+                key=lambda e: e.name
+            )
+
+        for entry in txt_files:
+            file = entry.name
+            raw_path = entry.path
+            out_path = os.path.join(PROCESSED_DIR, main_topic, subtopic, f"{os.path.splitext(file)[0]}_summary.yaml")
+            if os.path.exists(out_path) and os.path.getmtime(out_path) >= os.path.getmtime(raw_path):
+                print(f"Skipping {file} (summary is up to date)")
                 continue
 
-            raw_path = os.path.join(sub_path, file)
             raw_text = read_file(raw_path)
             if not raw_text:
                 print(f"Skipping empty file: {file}")
@@ -107,7 +264,7 @@ for main_topic in os.listdir(RAW_DIR):
             print(f"Processing file: {raw_path} (length {len(raw_text)})")
 
             # Generate final YAML directly from raw text
-            final_yaml = generate(
+            final_yaml = cached_generate(
                 final_summary_prompt(raw_text, main_topic, subtopic, "Various sources"),
                 MAX_FINAL_TOKENS
             )
@@ -116,7 +273,6 @@ for main_topic in os.listdir(RAW_DIR):
                 print(f"Skipping {file} — empty final YAML")
                 continue
 
-            out_path = os.path.join(PROCESSED_DIR, main_topic, subtopic, f"{os.path.splitext(file)[0]}_summary.yaml")
             save_yaml(final_yaml, out_path)
             print(f" Saved summary for {file} → {out_path} (length {len(final_yaml)} chars)")
 
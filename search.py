@@ -1,48 +1,97 @@
+import math
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from urllib.parse import urlparse
 from config import GOOGLE_API_KEY, GOOGLE_CSE_ID, BLACKLIST_DOMAINS, WHITELIST_DOMAINS
 
-from urllib.parse import urlparse
-from config import BLACKLIST_DOMAINS
+BLACKLIST = frozenset(d.lower().lstrip(".") for d in BLACKLIST_DOMAINS)
 
 def domain_allowed(url: str) -> bool:
-    domain = urlparse(url).netloc.lower()
-    # Only block blacklisted domains
-    if any(b in domain for b in BLACKLIST_DOMAINS):
+    domain = (urlparse(url).hostname or "").lower()
+    # Only block blacklisted domains (and their subdomains): check each
+    # suffix of the host, so "x.com" blocks "www.x.com" but not "fox.com"
+    labels = domain.split(".")
+    if any(".".join(labels[i:]) in BLACKLIST for i in range(len(labels))):
         return False
     return True
 
 # (google_search function remains the same, but now it will actually return URLs)
 
 
+CSE_URL = "https://www.googleapis.com/customsearch/v1"
+CSE_PAGE_SIZE = 10
+CSE_MAX_START = 91  # Custom Search serves at most 100 results per query
+MAX_PARALLEL_PAGES = 8
+MAX_RETRIES = 3
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# One pooled session keeps TLS connections to the API alive across pages and
+# queries; the adapter retries rate limits and 5xx with exponential backoff
+session = requests.Session()
+session.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=MAX_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=RETRY_STATUS,
+        raise_on_status=False,
+    ),
+))
+
+
+def fetch_page(query: str, start: int):
+    resp = session.get(
+        CSE_URL,
+        params={
+            "key": GOOGLE_API_KEY,
+            "cx": GOOGLE_CSE_ID,
+            "q": query,
+            "start": start,
+        },
+        timeout=10
+    )
+    return resp.json().get("items", [])
+
+
+def fetch_pages(query: str, starts):
+    # A single page (the usual case: MAX_URLS_PER_SUBSUBTOPIC fits in one page)
+    # is fetched inline; only multi-page waves pay for a thread pool
+    if len(starts) == 1:
+        return [fetch_page(query, starts[0])]
+
+    with ThreadPoolExecutor(max_workers=len(starts)) as pool:
+        return list(pool.map(lambda s: fetch_page(query, s), starts))
+
+
 def google_search(query: str, num_results: int):
     urls = []
     start = 1
 
-    while len(urls) < num_results:
-        resp = requests.get(
-            "https://www.googleapis.com/customsearch/v1",
-            params={
-                "key": GOOGLE_API_KEY,
-                "cx": GOOGLE_CSE_ID,
-                "q": query,
-                "start": start,
-            },
-            timeout=10
-        )
-
-        data = resp.json()
-        items = data.get("items", [])
-
-        for item in items:
-            url = item["link"]
-            if domain_allowed(url):
-                urls.append(url)
-                if len(urls) >= num_results:
-                    break
-
-        start += 10
-        if not items:
+    while len(urls) < num_results and start <= CSE_MAX_START:
+        # Request every page still needed at once; wall time is one round-trip per wave
+        missing = num_results - len(urls)
+        n_pages = min(math.ceil(missing / CSE_PAGE_SIZE), MAX_PARALLEL_PAGES)
+        starts = [s for s in range(start, start + n_pages * CSE_PAGE_SIZE, CSE_PAGE_SIZE) if s <= CSE_MAX_START]
+        pages = fetch_pages(query, starts)
+
+        exhausted = False
+        for items in pages:
+            for item in items:
+                url = item["link"]
+                if domain_allowed(url):
+                    urls.append(url)
+                    if len(urls) >= num_results:
+                        break
+
+            if not items or len(urls) >= num_results:
+                exhausted = not items
+                break
+
+        start = starts[-1] + CSE_PAGE_SIZE
+        if exhausted:
             break
 
     return urls
@@ -1,52 +1,61 @@
 """
 TOPICS = {
     "Introduction to Stocks": {
-        "what_stocks_are": [
-            # Beginner
-            "definition of a stock and types of stocks",
-            "how ownership and shares work",
-            "role of shareholders",
-            # Intermediate
-            "differences between common and preferred stocks",
-            "stock splits and reverse splits",
-            "how stock prices reflect company performance and market sentiment",
-            # Advanced
-            "understanding stock dilution, treasury shares, and insider holdings",
-            "impact of corporate actions (mergers, buybacks, spin-offs) on stock value",
-            "advanced valuation concepts: intrinsic vs market value"
-        ]
+        "what_stocks_are": {
+            "beginner": [
+                "definition of a stock and types of stocks",
+                "how ownership and shares work",
+                "role of shareholders"
+            ],
+            "intermediate": [
+                "differences between common and preferred stocks",
+                "stock splits and reverse splits",
+                "how stock prices reflect company performance and market sentiment"
+            ],
+            "advanced": [
+                "understanding stock dilution, treasury shares, and insider holdings",
+                "impact of corporate actions (mergers, buybacks, spin-offs) on stock value",
+                "advanced valuation concepts: intrinsic vs market value"
+            ]
+        }
     },
     "How Stock Markets Work": {
-        "exchanges_and_brokers": [
-            # Beginner
-            "major stock exchanges and how they function",
-            "role of brokers and trading platforms",
-            "different order types: market, limit, stop",
-            # Intermediate
-            "market makers and liquidity providers",
-            "trading hours, pre-market, and after-hours trading",
-            "dark pools and off-exchange trading",
-            # Advanced
-            "algorithmic trading, high-frequency trading (HFT), and market microstructure",
-            "understanding order book depth and order flow",
-            "impact of macroeconomic events on market behavior"
-        ]
+        "exchanges_and_brokers": {
+            "beginner": [
+                "major stock exchanges and how they function",
+                "role of brokers and trading platforms",
+                "different order types: market, limit, stop"
+            ],
+            "intermediate": [
+                "market makers and liquidity providers",
+                "trading hours, pre-market, and after-hours trading",
+                "dark pools and off-exchange trading"
+            ],
+            "advanced": [
+                "algorithmic trading, high-frequency trading (HFT), and market microstructure",
+                "understanding order book depth and order flow",
+                "impact of macroeconomic events on market behavior"
+            ]
+        }
     },
     "Key Market Terms": {
-        "market_terms": [
-            # Beginner
-            "bid and ask prices and spread",
-            "liquidity and trading volume",
-            "dividends and yield basics",
-            # Intermediate
-            "market capitalization and calculation",
-            "valuation metrics: P/E, P/B, PEG ratio",
-            "volatility measures: beta, ATR, implied volatility",
-            # Advanced
-            "understanding options Greeks (delta, gamma, theta, vega)",
-            "short interest, float, and institutional holdings",
-            "advanced risk metrics: VaR, Sharpe ratio, alpha and beta analysis"
-        ]
+        "market_terms": {
+            "beginner": [
+                "bid and ask prices and spread",
+                "liquidity and trading volume",
+                "dividends and yield basics"
+            ],
+            "intermediate": [
+                "market capitalization and calculation",
+                "valuation metrics: P/E, P/B, PEG ratio",
+                "volatility measures: beta, ATR, implied volatility"
+            ],
+            "advanced": [
+                "understanding options Greeks (delta, gamma, theta, vega)",
+                "short interest, float, and institutional holdings",
+                "advanced risk metrics: VaR, Sharpe ratio, alpha and beta analysis"
+            ]
+        }
     }
 }
 """
@@ -54,14 +63,16 @@ TOPICS = {
 
 TOPICS = {
     "Introduction to Stocks": {
-        "what_stocks_are": [
-            # Beginner
-            "definition of a stock and types of stocks",
-            #intermediate
-            "how stock prices reflect company performance and market sentiment",
-            # Advanced
-            "understanding stock dilution, treasury shares, and insider holdings",
-        
-        ]
+        "what_stocks_are": {
+            "beginner": [
+                "definition of a stock and types of stocks"
+            ],
+            "intermediate": [
+                "how stock prices reflect company performance and market sentiment"
+            ],
+            "advanced": [
+                "understanding stock dilution, treasury shares, and insider holdings"
+            ]
+        }
     }
 }